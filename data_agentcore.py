@@ -2,15 +2,25 @@
 # Generic Bedrock AgentCore app wired to Snowflake + Snowflake MCP
 
 import boto3
+from botocore.config import Config
+import copy
+import io
 from bedrock_agentcore import BedrockAgentCoreApp
 import json
 import logging
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import os
+import queue
+import re
 import sys
 import yaml
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from strands import Agent, tool
 # from strands.models.anthropic import AnthropicModel
 from strands.models.bedrock import BedrockModel
@@ -33,15 +43,85 @@ logger.addHandler(stdout_handler)
 # Configuration loading from config.yaml with safe defaults
 # -----------------------------------------------------------------------------
 
+# Prefer the libyaml-backed loader when available (much faster than pure Python)
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+# Parsed config keyed by path, validated against the file's (mtime, size)
+_CFG_CACHE: Dict[Path, Tuple[float, int, Dict[str, Any]]] = {}
+
+def _config_sidecar_path(config_file: Path) -> Path:
+    """Return the JSON cache path that sits next to config_file."""
+    return config_file.with_name(config_file.name + ".cache.json")
+
+def _load_from_json_cache(
+    config_file: Path, st: os.stat_result
+) -> Optional[Dict[str, Any]]:
+    """Return config from the JSON sidecar if it matches config_file, else None."""
+    sidecar = _config_sidecar_path(config_file)
+    try:
+        cached = orjson.loads(sidecar.read_bytes())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+    if (
+        not isinstance(cached, dict)
+        or cached.get("mtime_ns") != st.st_mtime_ns
+        or cached.get("size") != st.st_size
+    ):
+        return None
+    return cached.get("config") or {}
+
+def _parse_yaml_and_write_sidecar(
+    config_file: Path, st: os.stat_result
+) -> Dict[str, Any]:
+    """Parse config_file as YAML and refresh its JSON sidecar (best effort)."""
+    with open(config_file) as f:
+        config = yaml.load(f, Loader=_YamlLoader) or {}
+
+    sidecar = _config_sidecar_path(config_file)
+    tmp = sidecar.with_name(f"{sidecar.name}.{os.getpid()}.tmp")
+    try:
+        # Dates must raise rather than silently turn into strings
+        data = orjson.dumps(
+            {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "config": config},
+            option=orjson.OPT_PASSTHROUGH_DATETIME,
+        )
+        # Only cache configs that come back identical (e.g. no NaN/inf floats)
+        if orjson.loads(data)["config"] != config:
+            logger.debug(f"Config in {config_file} does not round-trip via JSON")
+            return config
+
+        # The sidecar holds secrets (pat_token); give it config.yaml's mode
+        mode = st.st_mode & 0o777
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, mode)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp, mode)
+        os.replace(tmp, sidecar)
+    except (OSError, TypeError) as e:
+        # Read-only filesystems or non-JSON YAML values just skip the sidecar
+        logger.debug(f"Could not write config cache {sidecar}: {e}")
+        tmp.unlink(missing_ok=True)
+    return config
+
 def load_config() -> Dict[str, Any]:
     """Load configuration from config.yaml file with fallback to empty dict."""
     config_file = Path(__file__).parent / "config.yaml"
     if config_file.exists():
         try:
-            with open(config_file) as f:
-                config = yaml.safe_load(f) or {}
+            st = config_file.stat()
+            cached = _CFG_CACHE.get(config_file)
+            if cached and cached[:2] == (st.st_mtime, st.st_size):
+                return copy.deepcopy(cached[2])
+
+            config = _load_from_json_cache(config_file, st)
+            if config is None:
+                config = _parse_yaml_and_write_sidecar(config_file, st)
+            _CFG_CACHE[config_file] = (st.st_mtime, st.st_size, config)
             logger.info(f"Configuration loaded from {config_file}")
-            return config
+            return copy.deepcopy(config)
         except Exception as e:
             logger.warning(f"Failed to load config.yaml: {e}. Using empty config.")
             return {}
@@ -49,12 +129,6 @@ def load_config() -> Dict[str, Any]:
         logger.warning("config.yaml not found, using empty config.")
         return {}
 
-def get_config(key: str, section: Optional[str] = None, default: Any = None) -> Any:
-    """Get configuration value from loaded config with an optional default."""
-    if section and section in CONFIG and key in CONFIG[section]:
-        return CONFIG[section][key]
-    return default
-
 # Load configuration once at module import
 CONFIG: Dict[str, Any] = load_config()
 
@@ -84,6 +158,32 @@ class MCPClient:
             f"{mcp_endpoint}/api/v2/databases/{database}/schemas/{schema}"
             f"/mcp-servers/{mcp_server_name}"
         )
+        # Persistent HTTP session so tool calls reuse the TLS connection
+        self._session = requests.Session()
+        self._session.headers.update(
+            {
+                "Content-Type": "application/json",
+                "Accept": "application/json",
+                "Authorization": f"Bearer {auth_token}",
+            }
+        )
+        self._session.mount(
+            "https://",
+            HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=16,
+                # tools/call is not idempotent: only retry when the request
+                # provably did not run (connect errors, 429/503 rejections)
+                max_retries=Retry(
+                    total=3,
+                    connect=3,
+                    read=0,
+                    backoff_factor=0.2,
+                    status_forcelist=[429, 503],
+                    allowed_methods=None,
+                ),
+            ),
+        )
 
     def _create_jsonrpc_payload(
         self,
@@ -113,81 +213,91 @@ class MCPClient:
         if request_id is None:
             request_id = 1
 
-        payload = self._create_jsonrpc_payload(
-            "tools/call", tool_name, arguments, request_id
-        )
-
-        headers = {
-            "Content-Type": "application/json",
-            "Accept": "application/json",
-            "Authorization": f"Bearer {self.auth_token}",
-        }
-
         try:
-            logger.info(
-                f"Calling MCP tool '{tool_name}' at {self.mcp_url} "
-                f"with arguments: {arguments}"
+            payload = self._create_jsonrpc_payload(
+                "tools/call", tool_name, arguments, request_id
             )
-            response = requests.post(
+            try:
+                body = orjson.dumps(payload)
+            except TypeError:
+                # orjson rejects ints wider than 64 bits; stdlib json does not
+                body = json.dumps(payload).encode()
+            logger.info(
+                "Calling MCP tool '%s' at %s with %d argument(s)",
+                tool_name,
                 self.mcp_url,
-                headers=headers,
-                json=payload,
-                timeout=30,
+                len(arguments),
             )
-            response.raise_for_status()
-            response_data = response.json()
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("MCP tool '%s' arguments: %r", tool_name, arguments)
+            # Stream the body so it is read once, straight into the parser.
+            # Stdlib json keeps NUMBER(38,0)-sized ints exact (orjson would
+            # turn anything beyond 64 bits into a float)
+            with self._session.post(
+                self.mcp_url,
+                data=body,
+                stream=True,
+                timeout=(3.05, 30),
+            ) as response:
+                response.raise_for_status()
+                response_data = json.loads(response.raw.read(decode_content=True))
             logger.info("MCP call completed successfully")
             return {"success": True, "response": response_data}
         except requests.exceptions.RequestException as e:
-            logger.error(f"HTTP request error calling MCP tool '{tool_name}': {e}")
+            logger.error("HTTP request error calling MCP tool '%s': %s", tool_name, e)
             return {"success": False, "error": f"HTTP request failed: {e}"}
         except json.JSONDecodeError as e:
-            logger.error(f"JSON decode error for MCP tool '{tool_name}': {e}")
+            logger.error("JSON decode error for MCP tool '%s': %s", tool_name, e)
             return {"success": False, "error": f"Invalid JSON response: {e}"}
         except Exception as e:
-            logger.error(f"Unexpected error calling MCP tool '{tool_name}': {e}")
+            logger.error("Unexpected error calling MCP tool '%s': %s", tool_name, e)
             return {"success": False, "error": str(e)}
 
 # -----------------------------------------------------------------------------
 # Snowflake / MCP configuration pulled from config.yaml
 # -----------------------------------------------------------------------------
 
+# Resolve each config section once; fields below are plain dict lookups
+_sf_config: Dict[str, Any] = CONFIG.get("snowflake") or {}
+_mcp_config: Dict[str, Any] = CONFIG.get("mcp") or {}
+_aws_config: Dict[str, Any] = CONFIG.get("aws") or {}
+
 SNOWFLAKE_ACCOUNT = (
     os.getenv("SNOWFLAKE_ACCOUNT")
-    or get_config("account", "snowflake")
+    or _sf_config.get("account")
 )
 
 SNOWFLAKE_USER = (
     os.getenv("SNOWFLAKE_USER")
-    or get_config("user", "snowflake")
+    or _sf_config.get("user")
 )
 
 SNOWFLAKE_PAT_TOKEN = (
     os.getenv("SNOWFLAKE_PAT_TOKEN")
-    or get_config("pat_token", "snowflake")
+    or _sf_config.get("pat_token")
 )
 
 SNOWFLAKE_DATABASE = (
     os.getenv("SNOWFLAKE_DATABASE")
-    or get_config("database", "snowflake")
+    or _sf_config.get("database")
 )
 
 SNOWFLAKE_SCHEMA = (
     os.getenv("SNOWFLAKE_SCHEMA")
-    or get_config("schema", "snowflake")
+    or _sf_config.get("schema")
 )
 
 SNOWFLAKE_WAREHOUSE = (
     os.getenv("SNOWFLAKE_WAREHOUSE")
-    or get_config("warehouse", "snowflake")
+    or _sf_config.get("warehouse")
 )
 
 MCP_SERVER_NAME = (
     os.getenv("MCP_SERVER_NAME")
-    or get_config("server_name", "mcp")
+    or _mcp_config.get("server_name")
 )
 
-AWS_PLACE_INDEX_NAME = get_config("place_index_name", "aws")
+AWS_PLACE_INDEX_NAME = _aws_config.get("place_index_name")
 
 # Build Snowflake base endpoint from account name
 MCP_ENDPOINT = f"https://{SNOWFLAKE_ACCOUNT}.snowflakecomputing.com"
@@ -209,13 +319,34 @@ mcp_client = MCPClient(
     mcp_server_name=MCP_SERVER_NAME,
 )
 
-# Initialize Amazon Location Service client for geocoding
-location_client = boto3.client("location")
+# Upper bound on in-flight Location Service requests per batch geocode
+GEOCODE_MAX_CONCURRENCY = 8
+
+# Shared client settings: larger pool, keep-alive, adaptive retries
+AWS_CLIENT_CONFIG = Config(
+    max_pool_connections=32,
+    tcp_keepalive=True,
+    retries={"mode": "adaptive", "max_attempts": 5},
+    connect_timeout=3,
+    read_timeout=30,
+)
+
+# Initialize Amazon Location Service client for geocoding (thread-safe, reused)
+location_client = boto3.client("location", config=AWS_CLIENT_CONFIG)
 
 # -----------------------------------------------------------------------------
 # Snowflake connection helper using PAT
 # -----------------------------------------------------------------------------
 
+# Idle Snowflake connections kept open between tool calls
+SNOWFLAKE_POOL_SIZE = 8
+_SF_POOL: "queue.Queue[snowflake.connector.SnowflakeConnection]" = queue.Queue(
+    maxsize=SNOWFLAKE_POOL_SIZE
+)
+
+# Maximum number of result rows fetched and rendered per query
+SNOWFLAKE_MAX_ROWS = 100
+
 def get_snowflake_connection():
     """Create and return a Snowflake connection using PAT as password."""
     try:
@@ -226,23 +357,94 @@ def get_snowflake_connection():
             database=SNOWFLAKE_DATABASE,
             schema=SNOWFLAKE_SCHEMA,
             warehouse=SNOWFLAKE_WAREHOUSE,
+            client_session_keep_alive=True,
+            client_session_keep_alive_heartbeat_frequency=900,
         )
         logger.info("Successfully connected to Snowflake using PAT token")
-
-        cursor = conn.cursor()
-        cursor.execute(f"USE WAREHOUSE {SNOWFLAKE_WAREHOUSE}")
-        cursor.close()
-        logger.info(f"Activated warehouse: {SNOWFLAKE_WAREHOUSE}")
-
         return conn
     except Exception as e:
-        logger.error(f"Failed to connect to Snowflake: {e}")
+        logger.error("Failed to connect to Snowflake: %s", e)
         return None
 
+# Statements that change session state (context, parameters, variables or
+# transactions), including scripting blocks and dynamic SQL that may do so;
+# connections that ran one are closed instead of pooled
+_SESSION_STATEMENT_RE = re.compile(
+    r"^(?:\s+|--[^\n]*(?:\n|$)|/\*.*?\*/)*"
+    r"(?:USE|ALTER\s+SESSION|SET|UNSET|BEGIN|START\s+TRANSACTION"
+    r"|EXECUTE\s+IMMEDIATE|DECLARE)\b",
+    re.IGNORECASE | re.DOTALL,
+)
+
+def _changes_session_state(statement: str) -> bool:
+    """Return True if statement leaves session state on its connection."""
+    return bool(_SESSION_STATEMENT_RE.match(statement))
+
+def _reset_snowflake_session(conn) -> bool:
+    """Roll back any open transaction; return True if conn is safe to pool."""
+    if conn.is_closed():
+        return False
+    # Deliberate cost: one round trip per pooled query, so a procedure that
+    # left a transaction open cannot leak it to the next borrower. Passing the
+    # warehouse to connect() instead of running USE WAREHOUSE saves a round
+    # trip only per new connection, so pooling still comes out ahead.
+    try:
+        conn.rollback()
+    except Exception as e:
+        logger.warning("Discarding Snowflake connection, rollback failed: %s", e)
+        return False
+    # Procedures can switch context too, so compare with the configured values
+    return all(
+        (current or "").upper() == (expected or "").upper()
+        for current, expected in (
+            (conn.database, SNOWFLAKE_DATABASE),
+            (conn.schema, SNOWFLAKE_SCHEMA),
+            (conn.warehouse, SNOWFLAKE_WAREHOUSE),
+        )
+    )
+
+@contextmanager
+def sf_conn(reusable: bool = True):
+    """Borrow a pooled Snowflake connection; reset it on return or close it."""
+    conn = None
+    while conn is None:
+        try:
+            conn = _SF_POOL.get_nowait()
+        except queue.Empty:
+            break
+        if conn.is_closed():
+            conn = None
+
+    if conn is None:
+        conn = get_snowflake_connection()
+
+    try:
+        yield conn
+    finally:
+        if conn is not None:
+            if reusable and _reset_snowflake_session(conn):
+                try:
+                    _SF_POOL.put_nowait(conn)
+                except queue.Full:
+                    conn.close()
+            elif not conn.is_closed():
+                conn.close()
+
 # -----------------------------------------------------------------------------
 # Generic tools: geocoding, MCP data tool, direct Snowflake SQL
 # -----------------------------------------------------------------------------
 
+def _format_geocode_response(response: Dict[str, Any]) -> dict:
+    """Reduce a search_place_index_for_text response to its best match."""
+    if response.get("Results"):
+        result = response["Results"][0]
+        return {
+            "coordinates": result["Place"]["Geometry"]["Point"],
+            "label": result["Place"]["Label"],
+        }
+
+    return {"error": "Address not found."}
+
 @tool
 def geocode_address(place_index_name: str, address: str) -> dict:
     """Geocode a street address into coordinates using Amazon Location Service."""
@@ -251,14 +453,30 @@ def geocode_address(place_index_name: str, address: str) -> dict:
         Text=address,
     )
 
-    if response.get("Results"):
-        result = response["Results"][0]
-        return {
-            "coordinates": result["Place"]["Geometry"]["Point"],
-            "label": result["Place"]["Label"],
-        }
+    return _format_geocode_response(response)
 
-    return {"error": "Address not found."}
+@tool
+def geocode_addresses(
+    place_index_name: str, addresses: List[str]
+) -> List[dict]:
+    """Geocode several street addresses concurrently using Amazon Location Service."""
+    if not addresses:
+        return []
+
+    def geocode_one(address: str) -> dict:
+        try:
+            response = location_client.search_place_index_for_text(
+                IndexName=place_index_name,
+                Text=address,
+            )
+        except Exception as e:
+            logger.error("Failed to geocode address '%s': %s", address, e)
+            return {"address": address, "error": str(e)}
+        return {"address": address, **_format_geocode_response(response)}
+
+    workers = min(GEOCODE_MAX_CONCURRENCY, len(addresses))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(geocode_one, addresses))
 
 @tool
 def call_mcp_data_tool(tool_name: str, arguments_json: str) -> str:
@@ -294,45 +512,68 @@ def call_mcp_data_tool(tool_name: str, arguments_json: str) -> str:
 @tool
 def run_snowflake_query(statement: str) -> str:
     """Execute a SQL statement in Snowflake and return a formatted result string."""
-    conn = None
-    cursor = None
-
     try:
-        conn = get_snowflake_connection()
-        if not conn:
-            return "Error: Failed to establish Snowflake connection"
-
-        cursor = conn.cursor()
-        cursor.execute(statement)
-
-        results = cursor.fetchall()
-        column_names = (
-            [desc[0] for desc in cursor.description] if cursor.description else []
-        )
+        with sf_conn(reusable=not _changes_session_state(statement)) as conn:
+            if not conn:
+                return "Error: Failed to establish Snowflake connection"
+
+            cursor = conn.cursor()
+            try:
+                logger.debug("Executing Snowflake statement: %s", statement)
+                cursor.execute(statement)
+
+                # Only the first SNOWFLAKE_MAX_ROWS rows are shown; fetch one
+                # extra to learn whether more exist without reading them all
+                results = cursor.fetchmany(SNOWFLAKE_MAX_ROWS + 1)
+                has_more = len(results) > SNOWFLAKE_MAX_ROWS
+                results = results[:SNOWFLAKE_MAX_ROWS]
+                # Past the limit, rowcount (when reported) gives the full size
+                if not has_more:
+                    total_rows = len(results)
+                elif cursor.rowcount and cursor.rowcount > len(results):
+                    total_rows = cursor.rowcount
+                else:
+                    total_rows = None
+                column_names = (
+                    [desc[0] for desc in cursor.description]
+                    if cursor.description
+                    else []
+                )
+            finally:
+                cursor.close()
 
         if not results:
             return "Query executed successfully. No results returned."
 
-        output = []
-        output.append(f"Query returned {len(results)} row(s)")
-        output.append("\nColumns: " + " | ".join(column_names))
-        output.append("-" * 80)
-
-        for i, row in enumerate(results[:100]):
-            row_str = " | ".join(
-                [str(val) if val is not None else "NULL" for val in row]
+        buf = io.StringIO()
+        if total_rows is None:
+            buf.write(f"Query returned more than {len(results)} row(s)\n")
+        else:
+            buf.write(f"Query returned {total_rows} row(s)\n")
+        buf.write("\nColumns: ")
+        buf.write(" | ".join(column_names))
+        buf.write("\n" + "-" * 80)
+
+        for i, row in enumerate(results):
+            buf.write(f"\nRow {i + 1}: ")
+            buf.write(
+                " | ".join("NULL" if val is None else str(val) for val in row)
             )
-            output.append(f"Row {i + 1}: {row_str}")
 
-        if len(results) > 100:
-            output.append(f"\n... ({len(results) - 100} more rows not shown)")
+        if has_more:
+            if total_rows is None:
+                buf.write("\n\n... (more rows not shown)")
+            else:
+                buf.write(
+                    f"\n\n... ({total_rows - len(results)} more rows not shown)"
+                )
 
-        return "\n".join(output)
+        return buf.getvalue()
     except snowflake.connector.errors.ProgrammingError as e:
-        logger.error(f"Snowflake query error: {e}")
+        logger.error("Snowflake query error: %s", e)
         return f"Query Error: {e}"
     except Exception as e:
-        logger.error(f"Unexpected error executing Snowflake query: {e}")
+        logger.error("Unexpected error executing Snowflake query: %s", e)
         return f"Error: {e}"
         
 
@@ -355,6 +596,7 @@ agent = Agent(
         use_aws,
         retrieve,
         geocode_address,
+        geocode_addresses,
         call_mcp_data_tool,
         run_snowflake_query,
     ],
@@ -386,7 +628,7 @@ def invoke(payload: dict) -> dict:
     Expects a JSON payload like: {"prompt": "<user question>"}.
     """
     prompt = payload.get("prompt", "Hello, how can I help you?")
-    logger.info(f"Using model: {agent.model.model_id}")    
+    logger.info("Using model: %s", agent.model.model_id)    
     response = agent(prompt)
     return {"result": response.message}
 
@@ -2,99 +2,154 @@
 # Generic CLI helper to invoke a Bedrock AgentCore runtime with streaming output
 
 import argparse
+import functools
 import json
-import subprocess
+import re
 import sys
 import textwrap
 
 import boto3
-
-# Create Bedrock AgentCore boto3 client
-agent_core_client = boto3.client("bedrock-agentcore")
+import orjson
+from botocore.config import Config
+
+# Keep-alive pooled connections; read timeout leaves room for slow agent steps
+boto_config = Config(
+    max_pool_connections=32,
+    retries={"mode": "adaptive", "max_attempts": 5},
+    tcp_keepalive=True,
+    connect_timeout=3,
+    read_timeout=120,
+)
+
+# Create Bedrock AgentCore boto3 clients (data plane and control plane)
+agent_core_client = boto3.client("bedrock-agentcore", config=boto_config)
+agent_core_control_client = boto3.client(
+    "bedrock-agentcore-control", config=boto_config
+)
+
+# orjson turns integers outside the 64-bit range into floats; any such integer
+# has at least 19 digits, so only payloads containing a 19-digit run need stdlib
+_WIDE_INT_RE = re.compile(rb"\d{19}")
+
+def loads_json(data):
+    """Decode JSON with orjson, using stdlib json when wide integers may occur."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if _WIDE_INT_RE.search(data):
+        return json.loads(data)
+    return orjson.loads(data)
 
 # -----------------------------------------------------------------------------
 # Streaming chunk formatter for nicer console UX
 # -----------------------------------------------------------------------------
 
+# Returned by a handler when its key is present but the chunk is not its shape
+_UNHANDLED = object()
+
+def _handle_tool_use(tool_info):
+    """Print a tool invocation event."""
+    tool_name = tool_info.get("name", "unknown_tool")
+    tool_args = tool_info.get("input", tool_info.get("arguments", {}))
+    print(f"\n[tool] {tool_name}")
+    if tool_args:
+        print(json.dumps(tool_args, indent=2))
+    print("[status] running...")
+    return ""
+
+def _handle_tool_result(result):
+    """Print a (truncated) tool result event."""
+    print("\n[tool] completed")
+    if isinstance(result, dict) and "content" in result:
+        content = result["content"]
+        if isinstance(content, str) and len(content) > 200:
+            print(f"[result] {content[:200]}...")
+        else:
+            print(f"[result] {content}")
+    print("[status] agent continuing...\n")
+    return ""
+
+def _handle_thinking(thinking):
+    """Print a thinking / reasoning event."""
+    print(f"\n[thinking] {thinking}")
+    return ""
+
+def _handle_step(step_info):
+    """Print step information."""
+    step_num = step_info.get("number", "?")
+    step_desc = step_info.get("description", step_info.get("action", ""))
+    print(f"\n[step {step_num}] {step_desc}")
+    return ""
+
+def _handle_status(status):
+    """Print a status update."""
+    print(f"\n[status] {status}")
+    return ""
+
+def _handle_content(content):
+    """Return main assistant text from a content chunk."""
+    if isinstance(content, list):
+        text_parts = []
+        for item in content:
+            if isinstance(item, dict) and "text" in item:
+                text_parts.append(item["text"])
+            elif isinstance(item, str):
+                text_parts.append(item)
+        return "".join(text_parts)
+    if isinstance(content, str):
+        return content
+    return str(content)
+
+def _handle_delta(delta):
+    """Return text from a delta-style chunk."""
+    if isinstance(delta, dict) and "content" in delta:
+        return delta["content"]
+    if isinstance(delta, str):
+        return delta
+    return _UNHANDLED
+
+def _handle_text(text):
+    """Return a bare text field."""
+    return text
+
+def _handle_event(event_type):
+    """Print an event marker."""
+    print(f"\n[event] {event_type}")
+    return ""
+
+# Chunk key -> handler, in priority order when a chunk carries several keys
+_CHUNK_HANDLERS = {
+    "tool_use": _handle_tool_use,
+    "tool_call": _handle_tool_use,
+    "tool_result": _handle_tool_result,
+    "thinking": _handle_thinking,
+    "reasoning": _handle_thinking,
+    "step": _handle_step,
+    "status": _handle_status,
+    "content": _handle_content,
+    "delta": _handle_delta,
+    "text": _handle_text,
+    "event": _handle_event,
+}
+_CHUNK_DISPATCH = tuple(_CHUNK_HANDLERS.items())
+
 def process_streaming_chunk(json_data):
     """Process streaming JSON chunks and format tool usage and output."""
     if isinstance(json_data, dict):
-        # Tool usage events
-        if "tool_use" in json_data or "tool_call" in json_data:
-            tool_info = json_data.get("tool_use", json_data.get("tool_call", {}))
-            tool_name = tool_info.get("name", "unknown_tool")
-            tool_args = tool_info.get("input", tool_info.get("arguments", {}))
-            print(f"\n[tool] {tool_name}")
-            if tool_args:
-                print(json.dumps(tool_args, indent=2))
-            print("[status] running...")
-            return ""
-
-        # Tool results
-        if "tool_result" in json_data:
-            result = json_data["tool_result"]
-            print("\n[tool] completed")
-            if isinstance(result, dict) and "content" in result:
-                content = result["content"]
-                if isinstance(content, str) and len(content) > 200:
-                    print(f"[result] {content[:200]}...")
-                else:
-                    print(f"[result] {content}")
-            print("[status] agent continuing...\n")
-            return ""
-
-        # Thinking / reasoning
-        if "thinking" in json_data or "reasoning" in json_data:
-            thinking = json_data.get("thinking", json_data.get("reasoning", ""))
-            print(f"\n[thinking] {thinking}")
-            return ""
-
-        # Step information
-        if "step" in json_data:
-            step_info = json_data["step"]
-            step_num = step_info.get("number", "?")
-            step_desc = step_info.get("description", step_info.get("action", ""))
-            print(f"\n[step {step_num}] {step_desc}")
-            return ""
-
-        # Status updates
-        if "status" in json_data:
-            status = json_data["status"]
-            print(f"\n[status] {status}")
-            return ""
-
-        # Content chunks (main assistant text)
-        if "content" in json_data:
-            content = json_data["content"]
-            if isinstance(content, list):
-                text_parts = []
-                for item in content:
-                    if isinstance(item, dict) and "text" in item:
-                        text_parts.append(item["text"])
-                    elif isinstance(item, str):
-                        text_parts.append(item)
-                return "".join(text_parts)
-            if isinstance(content, str):
-                return content
-            return str(content)
-
-        # Delta-style content
-        if "delta" in json_data:
-            delta = json_data["delta"]
-            if isinstance(delta, dict) and "content" in delta:
-                return delta["content"]
-            if isinstance(delta, str):
-                return delta
-
-        # Text field directly
-        if "text" in json_data:
-            return json_data["text"]
-
-        # Event markers
-        if "event" in json_data:
-            event_type = json_data["event"]
-            print(f"\n[event] {event_type}")
-            return ""
+        # Most chunks carry a single key: one table lookup, no priority scan
+        if len(json_data) == 1:
+            (key,) = json_data
+            handler = _CHUNK_HANDLERS.get(key)
+            if handler is None:
+                return None
+            result = handler(json_data[key])
+            return None if result is _UNHANDLED else result
+
+        for key, handler in _CHUNK_DISPATCH:
+            if key in json_data:
+                result = handler(json_data[key])
+                if result is not _UNHANDLED:
+                    return result
+        return None
 
     if isinstance(json_data, str):
         return json_data
@@ -105,19 +160,47 @@ def process_streaming_chunk(json_data):
 # Streaming invocation helper
 # -----------------------------------------------------------------------------
 
+# Bytes requested per read() from a buffered (non-SSE) response body
+STREAM_READ_SIZE = 65536
+
+# Bytes requested per read() from an SSE body; read(n) blocks until n bytes
+# arrive, so keep this small enough that events are printed as they stream
+SSE_READ_SIZE = 1024
+
+def iter_stream_lines(stream, chunk_size=SSE_READ_SIZE):
+    """Yield non-empty lines (split on CR, LF or CRLF) from a byte stream."""
+    pending = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        data = pending + chunk
+        lines = data.splitlines()
+        # Carry an unterminated last line over to the next read
+        pending = b"" if data[-1:] in b"\r\n" else lines.pop()
+        for line in lines:
+            if line:
+                yield line
+
+    if pending:
+        yield pending
+
+@functools.lru_cache(maxsize=1)
+def default_agent_runtime_arn():
+    """Return the ARN of the first AgentCore runtime in the account, or ""."""
+    response = agent_core_control_client.list_agent_runtimes(maxResults=1)
+    runtimes = response.get("agentRuntimes", [])
+    return runtimes[0]["agentRuntimeArn"] if runtimes else ""
+
 def stream_response(prompt, agent_arn=None, session_id=None):
     """Invoke a Bedrock AgentCore runtime with streaming output."""
     # Discover a default AgentCore runtime ARN if not provided (simple example)
     if agent_arn is None:
-        result = subprocess.run(
-            "aws bedrock-agentcore-control list-agent-runtimes "
-            "| jq -r .agentRuntimes[].agentRuntimeArn | head -n 1",
-            shell=True,
-            capture_output=True,
-            text=True,
-            executable="/bin/bash",
-        )
-        default_agent_arn = result.stdout.strip()
+        try:
+            default_agent_arn = default_agent_runtime_arn()
+        except Exception as e:
+            print(f"[error] listing agent runtimes: {e}")
+            return None
     else:
         default_agent_arn = agent_arn
 
@@ -125,7 +208,7 @@ def stream_response(prompt, agent_arn=None, session_id=None):
     agent_runtime_arn = agent_arn or default_agent_arn
     runtime_session_id = session_id or default_session_id        
 
-    payload = json.dumps({"prompt": prompt}).encode()
+    payload = orjson.dumps({"prompt": prompt})
 
     print(f"[invoke] agentRuntimeArn={agent_runtime_arn}")
     print(f"[invoke] sessionId={runtime_session_id}")
@@ -146,34 +229,27 @@ def stream_response(prompt, agent_arn=None, session_id=None):
         if "text/event-stream" in response.get("contentType", ""):
             # Handle SSE-style streaming
             stream = response.get("response", {})
-            if hasattr(stream, "iter_lines"):
-                for line in stream.iter_lines():
-                    if not line:
-                        continue
-
-                    if isinstance(line, bytes):
-                        try:
-                            line_str = line.decode("utf-8")
-                        except UnicodeDecodeError:
-                            line_str = line.decode("utf-8", errors="replace")
-                    else:
-                        line_str = str(line)
-
-                    if line_str.startswith("data: "):
-                        data_content = line_str[6:].strip()
-                        if not data_content or data_content == "[DONE]":
+            if hasattr(stream, "read"):
+                for line in iter_stream_lines(stream):
+                    # Match the SSE prefix on raw bytes; orjson parses bytes
+                    # directly, so data frames are never decoded to str
+                    if line.startswith(b"data: "):
+                        data_content = line[6:].strip()
+                        if not data_content or data_content == b"[DONE]":
                             continue
 
                         try:
-                            json_data = json.loads(data_content)
+                            json_data = loads_json(data_content)
                             chunk = process_streaming_chunk(json_data)
                             if chunk:
                                 print(chunk, end="", flush=True)
                                 content_parts.append(chunk)
-                        except json.JSONDecodeError:
-                            print(data_content, end="", flush=True)
-                            content_parts.append(data_content)
+                        except ValueError:
+                            text = data_content.decode("utf-8", errors="replace")
+                            print(text, end="", flush=True)
+                            content_parts.append(text)
                     else:
+                        line_str = line.decode("utf-8", errors="replace")
                         print(line_str, end="", flush=True)
                         content_parts.append(line_str)
         else:
@@ -198,54 +274,32 @@ def handle_non_streaming_response(response):
 
     if hasattr(response_data, "read"):
         print("[stream] streaming body detected")
-        content_buffer = ""
-        json_buffer = ""
-        byte_buffer = b""
+        byte_buffer = bytearray()
 
+        # Accumulate the body in large reads and parse it once at the end
         while True:
-            chunk = response_data.read(64)
+            chunk = response_data.read(STREAM_READ_SIZE)
             if not chunk:
-                if byte_buffer:
-                    try:
-                        chunk_str = byte_buffer.decode("utf-8", errors="replace")
-                        content_buffer += chunk_str
-                        json_buffer += chunk_str
-                    except Exception:
-                        pass
                 break
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            byte_buffer += chunk
+
+        content_buffer = byte_buffer.decode("utf-8", errors="replace")
 
-            if isinstance(chunk, bytes):
-                byte_buffer += chunk
-                try:
-                    chunk_str = byte_buffer.decode("utf-8")
-                    content_buffer += chunk_str
-                    json_buffer += chunk_str
-                    byte_buffer = b""
-                except UnicodeDecodeError:
-                    if len(byte_buffer) > 4096:
-                        chunk_str = byte_buffer.decode("utf-8", errors="replace")
-                        content_buffer += chunk_str
-                        json_buffer += chunk_str
-                        byte_buffer = b""
-            else:
-                chunk_str = str(chunk)
-                content_buffer += chunk_str
-                json_buffer += chunk_str
-
-            try:
-                json_data = json.loads(json_buffer)
-                json_buffer = ""
-                chunk_out = process_streaming_chunk(json_data)
-                if chunk_out:
-                    print(chunk_out, end="", flush=True)
-            except json.JSONDecodeError:
-                pass
+        try:
+            json_data = loads_json(byte_buffer)
+            chunk_out = process_streaming_chunk(json_data)
+            if chunk_out:
+                print(chunk_out, end="", flush=True)
+        except ValueError:
+            pass
 
         print("\n[stream] complete")
         return content_buffer
 
     try:
-        data = json.loads(response_data)
+        data = loads_json(response_data)
         chunk = process_streaming_chunk(data)
         if chunk:
             print(chunk)